@@ -1,20 +1,53 @@
 # NEW: talk to your Apps Script endpoint
-import base64, requests
+import base64, copy, hmac, orjson, requests, sys
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import streamlit as st
 import pandas as pd
 from io import BytesIO
 from datetime import date
+from types import MappingProxyType
+from typing import IO, Iterable, NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import chain
+from operator import attrgetter
 
 # --- Direct PDF generation (works on Streamlit Cloud) ---
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.pdfbase import pdfmetrics
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table as PDFTable, TableStyle
 
 
 # ==================== Data helpers ====================
+# Accepted semester spellings -> canonical value
+_SEM_MAP = MappingProxyType({
+    "I": "first", "1": "first", "First": "first", "first": "first",
+    "II": "second", "2": "second", "Second": "second", "second": "second",
+    "first&Second": "first&second", "First&Second": "first&second", "first&second": "first&second",
+})
+
+
+class Course(NamedTuple):
+    """Immutable course record (NamedTuple: hashed natively by st.cache_data, equal by value across reruns)."""
+    name: str
+    code: str
+    cfu: int
+    dept: str
+    year: str
+    semester: str
+    links: tuple[str, ...] = ()
+    label: str = ""
+    cells: tuple[str, ...] = ()  # PDF table row, already stringified in _COL_WIDTHS order
+
+
+_cfu = attrgetter("cfu")  # for sum(map(_cfu, courses))
+
+
 def make_course(
         name: str,
         code: str,
@@ -22,58 +55,501 @@ def make_course(
         dept: str = "DIETI",
         year: str = "Second",
         semester: str = "Second",
-        links: list | None = None,
-):
-    """Create a normalized course dict (with optional list of links)."""
+        links: Iterable[str] = (),
+) -> Course:
+    """Create a normalized, immutable Course (with optional links and its precomputed display label)."""
     s = str(semester).strip()
-    mapping = {
-        "I": "first", "1": "first", "First": "first", "first": "first",
-        "II": "second", "2": "second", "Second": "second", "second": "second",
-        "first&Second": "first&second", "First&Second": "first&second", "first&second": "first&second",
-    }
-    sem_norm = mapping.get(s, s)
-    return {
-        "name": name,
-        "code": code,
-        "cfu": int(cfu),
-        "dept": dept,
-        "year": year,
-        "semester": sem_norm,
-        "links": links or [],
-    }
+    # Dept/year/semester repeat across the whole catalog, and many names/codes recur across sub paths and the
+    # free-choice list: intern them so every course shares one copy (and equal strings compare by identity)
+    sem_norm = sys.intern(_SEM_MAP.get(s, s))
+    cfu = int(cfu)
+    name, code = sys.intern(str(name)), sys.intern(str(code))
+    dept, year = sys.intern(dept), sys.intern(year)
+    return Course(
+        name, code, cfu, dept, year, sem_norm,
+        tuple(links) if links else (),
+        f"{name} ({code}, {cfu} CFU)",
+        (name, dept, code, str(cfu), year, sem_norm),
+    )
+
+
+def free_choice_key(code: str) -> str:
+    """Registry key for a free-choice course: its code, trimmed and upper-cased."""
+    return str(code).strip().upper()
 
 
 def course_label(c):
-    return f"{c['name']} ({c['code']}, {c['cfu']} CFU)"
+    """Display label ('Name (CODE, N CFU)'), precomputed by make_course."""
+    return c.label
+
+
+OVERVIEW_COLUMNS = (
+    "Type", "Main Path", "Sub Path", "Slot", "Course", "Code", "CFU", "Dept", "Year", "Semester", "Link 1", "Link 2",
+)
+# Low-cardinality overview columns, stored as pandas categories (one small code array instead of N string objects)
+_OVERVIEW_CATEGORICAL = dict.fromkeys(("Type", "Main Path", "Sub Path", "Slot", "Dept", "Year", "Semester"), "category")
+
+
+def overview_row(c: Course, kind: str, main_path: str = "—", sub_path: str = "—", slot: str = "—") -> tuple:
+    """One row of the Catalog Overview table, in OVERVIEW_COLUMNS order."""
+    links = c.links
+    return (
+        kind, main_path, sub_path, slot, c.name, c.code, c.cfu, c.dept, c.year, c.semester,
+        links[0] if len(links) > 0 else None,
+        links[1] if len(links) > 1 else None,
+    )
+
+
+def flatten_catalog(catalog: dict) -> list[tuple]:
+    """Flatten {main path: {sub path: [courses]}} into Catalog Overview rows."""
+    return [
+        overview_row(c, "Curricular", main_path, sub_path, f"Curricular {idx}")
+        for main_path, subpaths in catalog.items()
+        for sub_path, courses in subpaths.items()
+        for idx, c in enumerate(courses, start=1)
+    ]
 
 # --- helper to serialize courses for logging ---
-def serialize_course(c: dict) -> dict:
+def serialize_course(c: Course) -> dict:
     return {
-        "name": c.get("name", ""),
-        "code": str(c.get("code", "")),
-        "cfu": int(c.get("cfu", 0) or 0),
-        "dept": c.get("dept", ""),
-        "year": c.get("year", ""),
-        "semester": c.get("semester", ""),
+        "name": c.name,
+        "code": str(c.code),
+        "cfu": int(c.cfu or 0),
+        "dept": c.dept,
+        "year": c.year,
+        "semester": c.semester,
     }
-def meets_free_requirement(free_courses: list[dict], plan_is_psi: bool) -> bool:
+
+
+@lru_cache(maxsize=256)
+def _serialized_course(c: Course) -> dict:
+    """serialize_course(c), memoized per (immutable) Course; the dict is shared, so callers must not mutate it."""
+    return serialize_course(c)
+
+
+# Custom free-choice issues by kind; shown as "- #<entry>: <message>" with the offending value filled in
+_CUSTOM_FREE_ISSUES = MappingProxyType({
+    "curr_code": "code '{}' duplicates a curricular course.",
+    "curr_name": "name '{}' duplicates a curricular course.",
+    "banned_code": "code '{}' is not allowed for the selected sub path.",
+    "dup_code": "code '{}' is duplicated in your custom list.",
+    "dup_name": "name '{}' is duplicated in your custom list.",
+})
+
+
+def custom_free_errors(entries: list[Course], curr_codes, curr_names, banned_codes) -> list[tuple[str, int, str]]:
+    """One pass over manually entered free-choice courses: clashes with the curriculum, banned codes, duplicates.
+
+    Returns (kind, entry number, offending value) tuples; format_custom_free_errors renders them.
+    """
+    issues = []
+    seen_codes, seen_names = set(), set()
+    for i, cf in enumerate(entries, start=1):
+        code_up = cf.code.strip().upper()
+        name_lo = cf.name.strip().lower()
+        if code_up and code_up in curr_codes:
+            issues.append(("curr_code", i, cf.code))
+        if name_lo and name_lo in curr_names:
+            issues.append(("curr_name", i, cf.name))
+        if code_up and code_up in banned_codes:
+            issues.append(("banned_code", i, cf.code))
+        if code_up:
+            if code_up in seen_codes:
+                issues.append(("dup_code", i, cf.code))
+            seen_codes.add(code_up)
+        if name_lo:
+            if name_lo in seen_names:
+                issues.append(("dup_name", i, cf.name))
+            seen_names.add(name_lo)
+    return issues
+
+
+def format_custom_free_errors(issues: list[tuple[str, int, str]]) -> str:
+    """Markdown bullet list for custom_free_errors() results."""
+    return "\n".join(f"- #{i}: " + _CUSTOM_FREE_ISSUES[kind].format(value) for kind, i, value in issues)
+
+
+def meets_free_requirement(free_courses: list[Course], plan_is_psi: bool) -> bool:
     """Standard: allow 1×12 CFU or 2 courses totaling ≥12 CFU. PSI: exactly 3."""
     if plan_is_psi:
         return len(free_courses) == 3
-    total = sum(int(c.get("cfu", 0) or 0) for c in free_courses)
+    total = sum(map(_cfu, free_courses))
     n = len(free_courses)
     return (n == 1 and total >= 12) or (n == 2 and total >= 12)
 
 
 # Fixed second-year components
-FIXED_COMPONENTS = [
+FIXED_COMPONENTS = (
     make_course("ALTRE ATTIVITA", "12568", 6, "DIETI – LM Data Science", "Second", "second"),
     make_course("TESI DI LAUREA", "U2848", 16, "DIETI – LM Data Science", "Second", "second"),
     make_course("TIROCINIO/STAGE", "U4319", 8, "DIETI – LM Data Science", "Second", "second"),
-]
+)
+FIXED_CFU_TOTAL = sum(map(_cfu, FIXED_COMPONENTS))
+# Upload-log form of the fixed components (serialized once; orjson writes the tuple as a JSON array)
+FIXED_COMPONENTS_SERIALIZED = tuple(serialize_course(c) for c in FIXED_COMPONENTS)
+
+# Overview rows for the fixed components never change
+_FIXED_FLAT = tuple(overview_row(c, "Fixed") for c in FIXED_COMPONENTS)
+
+
+# ==================== Default catalog ====================
+def _read_only_catalog(catalog: dict) -> MappingProxyType:
+    """Freeze {main: {sub: [courses]}} into read-only mappings of tuples (identical courses share one record)."""
+    shared = {}
+    return MappingProxyType({
+        main: MappingProxyType({sub: tuple(shared.setdefault(c, c) for c in courses) for sub, courses in subs.items()})
+        for main, subs in catalog.items()
+    })
+
+
+# Built once per process and shared (read-only) by every session: copy before editing.
+@st.cache_resource
+def build_default_catalog() -> MappingProxyType:
+    """Predefined {main path: {sub path: [Curricular I, Curricular II]}} catalog."""
+    return _read_only_catalog({
+        "Curriculum FUNDAMENTAL SCIENCES": {
+            "FSE/PH - CURRICULUM FUNDAMENTAL SCIENCES/PHYSICS INSPIRED METHODOLOGIES": [
+                make_course(
+                    "Advanced Statistical Learning and Modeling",
+                    "U5450", 12, "DIETI – LM Data Science", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento",
+                    ],
+                ),
+                make_course(
+                    "Physics Informed Machine Learning",
+                    "U****", 6, "DIETI - LM Data Science", "Second", "second",
+                ),
+            ],
+            "PDS FSE/MM - CURRICULUM FUNDAMENTAL SCIENCES/MATHEMATICAL METHODOLOGIES": [
+                make_course(
+                    "Algorithms and Parallel Computing and Computational Complexity",
+                    "U5430", 12, "DMRC - LM Ing. Matematica D71", "Second", "first&second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e49454c4c4f4d5552414e4f4d524e4e4c4c3731543230493037334c/schede_insegnamento",
+                        "https://www.docenti.unina.it/#!/professor/4749554c49414e4f4c414343455454494c4343474c4e3534443233463833394c/schede_insegnamento",
+                    ],
+                ),
+                make_course(
+                    "Operational Research",
+                    "U1624", 6, "DMRC - LM Ing. Matematica D71", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/44414e49454c454645524f4e4546524e444e4c38355232384638333944/programmi/shedainsegnamento",
+                    ],
+                ),
+            ],
+        },
+        "Curriculum INFORMATION TECHNOLOGIES": {
+            "PDS ITE/TS - CURRICULUM INFORMATION TECHNOLOGIES/TEXT AND SPEECH PROCESSING": [
+                make_course(
+                    "Multimedia Information Retrieval and Text Mining",
+                    "U5441", 12, "DIETI – LM Data Science", "Second", "first&second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e544f4e494f204d4152494152494e414c4449524e4c4e4e4d37355232374239363359/schede_insegnamento",
+                        "https://www.docenti.unina.it/#!/professor/414e4e41434f52415a5a4143525a4e4e4136344c35374c37383144/schede_insegnamento",
+                    ],
+                ),
+                # UPDATED: Curricular II is Speech Processing (6 CFU)
+                make_course(
+                    "Speech Processing",
+                    "U6636", 6, "DIETI – LM Data Science", "Second", "second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/schede_insegnamento",
+                    ],
+                ),
+            ],
+            "PDS ITE/SV - CURRICULUM INFORMATION TECHNOLOGIES/SIGNAL AND VIDEO PROCESSING": [
+                make_course(
+                    "Information Theory and Signals Theory",
+                    "U5444", 12, "DMRC - LM Ing. Matematica D71", "Second", "first&second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e544f4e4941204d4152494154554c494e4f544c4e4e4e4d3731503532463833394e/programmi/programma",
+                        "https://www.docenti.unina.it/#!/professor/4d4152494f54414e4441544e444d524136334c31354135313246/programmi/shedainsegnamento",
+                    ],
+                ),
+                make_course(
+                    "Image and Video Processing for Autonomous Driving",
+                    "U3423", 6, "DII - LM Autonomous Vehicle Engineering", "Second", "second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/4c55495341564552444f4c4956415652444c535537324d36324c38343551/programmi/shedainsegnamento",
+                    ],
+                ),
+            ],
+            "PDS ITE/RS - CURRICULUM INFORMATION TECHNOLOGIES/ STATISTICS AND ROBOTICS FOR HEALTH": [
+                make_course(
+                    "Advanced Statistical Learning and Modeling",
+                    "U5450", 12, "DMRC - DIETI – LM Data Science", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento",
+                    ],
+                ),
+                make_course(
+                    "Robotics for Bioengineering",
+                    "U1579", 6, "LM Ing. Automazione e Robotica", "Second", "second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/46414e4e59464943554349454c4c4f464343464e5937345236304639313248/programmi/shedainsegnamento",
+                    ],
+                ),
+            ],
+            "PDS ITE/IA - CURRICULUM INFORMATION TECHNOLOGIES/INDUSTRIAL APPLICATIONS": [
+                make_course(
+                    "Advanced Statistical Learning and Modeling",
+                    "U5450", 12, "DMRC - DIETI – LM Data Science", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento",
+                    ],
+                ),
+                make_course(
+                    "Statistical Methods for Industrial Process Monitoring",
+                    "U2659", 6, "DMRC - LM Ing. Matematica D71", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e544f4e494f4c45504f52454c50524e544e37394c32374137383353/programmi/programma",
+                    ],
+                ),
+            ],
+            "PDS ITE/AI - CURRICULUM INFORMATION TECHNOLOGIES/DATA SECURITY": [
+                make_course(
+                    "Data Security and Computer Forensics",
+                    "U5447", 12, "DMRC - DIETI – LM Informatica", "Second", "second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/524f424552544f4e4154454c4c414e544c52525438334c32334637393953/schede_insegnamento",
+                        "https://www.docenti.unina.it/#!/professor/4c4f52454e5a4f4c41555241544f4c52544c4e5a37304332325a3133335a/programmi/shedainsegnamento",
+                    ],
+                ),
+                make_course(
+                    "Algorithm Design",
+                    "U3524", 6, "DIETI – LM Data Science", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/464142494f4d4f47415645524f4d475646424138334533314837303341/programmi/shedainsegnamento",
+                    ],
+                ),
+            ],
+        },
+        "Curriculum PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT – ECO": {
+            "PDS ECO - CURRICULUM PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT": [
+                make_course(
+                    "Computational Statistical and Generalized Linear Models",
+                    "U5453", 12, "DIETI – LM Data Science", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e544f4e494f4427414d42524f53494f444d424e544e3730533239413738334e/schede_insegnamento",
+                    ],
+                ),
+                make_course(
+                    "Financial Time Series Analysis",
+                    "U6373", 6, "DISES – LM Economics and Finance DH5", "Second", "first",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/4341524d454c41494f52494f52494f434d4c38354336324638333951/schede_insegnamento",
+                    ],
+                ),
+            ],
+        },
+        "Curriculum INTELLIGENT SYSTEMS - ISY": {
+            "PDS ISY - CURRICULUM INTELLIGENT SYSTEMS": [
+                # UPDATED: Department is LM Physics only
+                make_course(
+                    "Computational Intelligence and Machine Learning for Physics",
+                    "U5460", 12, "DFEP – LM Physics", "Second", "second",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/46455244494e414e444f4449204d415254494e4f444d5246444e3635433235463833394b/programmi/shedainsegnamento",
+                    ],
+                ),
+                make_course(
+                    "Generative Artificial Intelligence",
+                    "U7215", 6, "DIETI – LM Data Science", "Second", "first",
+                ),
+            ],
+        },
+    })
+
+
+@st.cache_resource
+def build_free_choice_courses() -> MappingProxyType:
+    """Predefined free-choice (autonomous choice) courses, as a read-only {normalized code: course} registry."""
+    courses = (
+        make_course("Advanced Statistical Learning and Modeling", "U5450", 12, "DIETI – LM Data Science", "Second",
+                    "I", links=[
+                "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento"]),
+        make_course("AI Systems Engineering", "U5494", 6, "DIETI – LM Ing. Informatica", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/524f424552544f5049455452414e54554f4e4f50545252525438305332344632323448/programmi/shedainsegnamento"]),
+        make_course("Astroinformatics", "U1205", 6, "DFEP – LM Fisica", "Second", "II", links=[
+            "https://www.docenti.unina.it/#!/professor/53544546414e4f434156554f544943565453464e38324130374837303359/programmi"]),
+        make_course("Biometric Systems", "U3525", 6, "DIETI – LM Informatica", "Second", "II", links=[
+            "https://www.docenti.unina.it/#!/professor/44414e49454c52494343494f524343444e4c37384831365a3131344d/programmi"]),
+        make_course("Computational Intelligence", "U7219", 6, "DIETI – LM Data Science", "Second", "II", links=[
+            "https://www.docenti.unina.it/#!/professor/46455244494e414e444f4449204d415254494e4f444d5246444e3635433235463833394b/programmi/shedainsegnamento"]),
+        make_course("Computational Statistical and Generalized Linear Models", "U5453", 12,
+                    "DIETI – LM Data Science", "Second", "I", links=[
+                "https://www.docenti.unina.it/#!/professor/414e544f4e494f4427414d42524f53494f444d424e544e3730533239413738334e/schede_insegnamento"]),
+        make_course("Computer Vision", "U3523", 6, "DIETI – LM Informatica", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/4652414e434553434f495347524f27534752464e4336365432364732373341/programmi/shedainsegnamento"]),
+        make_course("Data Security", "U2652", 6, "DIETI – LM Data Science", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/524f424552544f4e4154454c4c414e544c52525438334c32334637393953/programmi/shedainsegnamento"]),
+        make_course("Data Visualization", "U2658", 6, "DIETI – LM Data Science", "Second", "II", links=[
+            "https://www.docenti.unina.it/#!/professor/524f424552544f5049455452414e54554f4e4f50545252525438305332344632323448/programmi/shedainsegnamento"]),
+        make_course("Generative Artificial Intelligence", "U7215", 6, "DIETI – LM Data Science", "Second", "I"),
+        make_course("Financial Time Series Analysis", "U6373", 6, "DISES – LM Econ. and Finance", "Second", "I",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/4341524d454c41494f52494f52494f434d4c38354336324638333951/schede_insegnamento"]),
+        make_course("Human robot interaction", "U3536", 6, "DIETI – LM Informatica", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/53494c564941524f535349525353534c563737453536423936334e/programmi/shedainsegnamento"]),
+        make_course("Image and Video Processing for Autonomous Driving", "U3423", 6,
+                    "DII - LM Autonomous Vehicle Engineering", "Second", "II", links=[
+                "https://www.docenti.unina.it/#!/professor/4c55495341564552444f4c4956415652444c535537324d36324c38343551/programmi/shedainsegnamento"]),
+        make_course("Information Systems and Business Intelligence", "U3546", 6, "DIETI – LM Ing. Informatica",
+                    "Second", "I", links=[
+                "https://www.docenti.unina.it/#!/professor/464c4f5241414d41544f4d5441464c5237395036314c3235394c/schede_insegnamento"]),
+        make_course("Information Theory", "U1644", 6, "DMRC - LM Ing. Matematica", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/414e544f4e4941204d4152494154554c494e4f544c4e4e4e4d3731503532463833394e/schede_insegnamento"]),
+        make_course("Methods for Artificial Intelligence", "U3522", 6, "DIETI – LM Informatica", "Second", "II",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/53494c564941524f535349525353534c563737453536423936334e/programmi/shedainsegnamento"]),
+        make_course("Natural Language Processing", "U3539", 6, "DIETI – LM Informatica", "Second", "II", links=[
+            "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/programmi/shedainsegnamento"]),
+        make_course("Physics Informed Machine Learning", "NI", 6, "DIETI – LM Data Science", "Second", "II"),
+        make_course("Preference learning", "U6641", 6, "DISES – LM Economia e Commercio", "Second", "I"),
+        make_course("Reliability and Risk in Aerospace Engineering", "U3835", 6, "DII – LM Ing. Aerospaziale",
+                    "Second", "II", links=[
+                "https://www.docenti.unina.it/#!/professor/4d415353494d494c49414e4f47494f5247494f4752474d534d3636523133463833394d/programmi/shedainsegnamento"]),
+        make_course("Robotics Lab", "U2325", 6, "DIETI – LM Ing. Automazione e Robotica", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/4a4f4e415448414e4341434143454343434a544838375431334638333949/programmi/programma"]),
+        make_course("Software Architecture Design", "U5937", 6, "DIETI – LM Ing. Informatica", "Second", "I",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e4e4120524954414641534f4c494e4f46534c4e525436355334374639313245/schede_insegnamento"]),
+        make_course("Speech Processing", "U6636", 6, "DIETI – LM Data Science", "Second", "II", links=[
+            "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/schede_insegnamento"]),
+        make_course("Statistical Methods for Industrial Process Monitoring", "U2659", 6,
+                    "DMRC - LM Ing. Matematica", "Second", "I", links=[
+                "https://www.docenti.unina.it/#!/professor/414e544f4e494f4c45504f52454c50524e544e37394c32374137383353/programmi/programma"]),
+        make_course("SW and methods for statistical analysis of economic data", "U6640", 6,
+                    "DIETI – LM Data Science", "Second", "II", links=[
+                "https://www.docenti.unina.it/#!/professor/414c464f4e534f494f44494345204427454e5a414443444c4e5337374c31384638333946/schede_insegnamento"]),
+        make_course("Techniques of Text Analysis and Computational Linguistic", "U6635", 6,
+                    "DIETI – LM Data Science", "Second", "I", links=[
+                "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/programmi/shedainsegnamento"]),
+        make_course("Text Mining", "U5902", 6, "DIETI – LM Data Science", "Second", "I", links=[
+            "https://www.docenti.unina.it/#!/professor/414e4e41434f52415a5a4143525a4e4e4136344c35374c37383144/schede_insegnamento"]),
+        make_course("Advanced Microeconomics", "25880", 12, "DISES – LM Economics and Finance", "Second", "I",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/47494f56414e4e49494d4d4f5244494e4f4d4d52474e4e36394530384732373359/programmi/programma"]),
+        make_course("Advanced Macroeconomics", "25881", 12, "DISES – LM Economics and Finance", "Second", "II",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/54554c4c494f4a415050454c4c494a5050544c4c35365032324638333955/programmi/shedainsegnamento"]),
+        make_course("Economics of Regulation", "27381", 6, "DISES – LM Economics and Finance", "Second", "II",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/4d4152434f5041474e4f5a5a4950474e4d524337324331344638333944/programmi/shedainsegnamento"]),
+        make_course("Financial Econometrics", "27382", 6, "DISES – LM Economics and Finance", "Second", "II",
+                    links=[
+                        "https://www.docenti.unina.it/#!/professor/414e4e414c49534153434f474e414d49474c494f5343474e4c5338355234314638333953/programmi/shedainsegnamento"]),
+        make_course("Mathematics for Economics and Finance", "25884", 12, "DISES – LM Economics and Finance",
+                    "Second", "I", links=[
+                "https://www.docenti.unina.it/#!/professor/414348494c4c45424153494c4542534c434c4c3538413231493239334f/programmi/shedainsegnamento"]),
+    )
+    # Entries identical to a curricular course (same code, dept, links, …) reuse that record instead of a copy
+    curricular = {c: c for subs in build_default_catalog().values() for group in subs.values() for c in group}
+    return MappingProxyType({free_choice_key(c.code): curricular.get(c, c) for c in courses})
+
+
+def _refresh_free_index():
+    """Rebuild the session's name and label lookups over the free-choice courses."""
+    courses = st.session_state.free_choice_courses.values()
+    st.session_state.free_index = {c.name: c for c in courses}
+    st.session_state.free_by_label = {c.label: c for c in courses}
+    st.session_state.free_choice_views = {}
+
+
+# Free-choice codes a sub path may not pick (they are already part of that curriculum's core)
+_BANNED_BY_SUBPATH = MappingProxyType({
+    "PDS ITE/TS - CURRICULUM INFORMATION TECHNOLOGIES/TEXT AND SPEECH PROCESSING": frozenset({"U5902"}),  # Text Mining
+    "PDS ITE/SV - CURRICULUM INFORMATION TECHNOLOGIES/SIGNAL AND VIDEO PROCESSING": frozenset({"U1644"}),
+    # Information Theory
+    "PDS ITE/AI - CURRICULUM INFORMATION TECHNOLOGIES/DATA SECURITY": frozenset({"U2652"}),  # Data Security
+    "PDS ISY - CURRICULUM INTELLIGENT SYSTEMS": frozenset({"U7219"}),  # Computational Intelligence
+})
+
+
+def _free_choice_view(main: str, sub: str, plan_is_psi: bool) -> tuple[frozenset, frozenset, frozenset, dict]:
+    """Curricular code/name sets, the banned free-choice codes and the catalogue courses still allowed ({label: course}).
+
+    Memoized per session by (main, sub, PSI); reset whenever the teacher edits the catalog or the free-choice list.
+    """
+    views = st.session_state.setdefault("free_choice_views", {})
+    key = (main, sub, plan_is_psi)
+    if key not in views:
+        banned_codes = _BANNED_BY_SUBPATH.get(sub, frozenset())
+        curr = st.session_state.catalog[main][sub]
+        curricular = curr[:1] if plan_is_psi else curr
+        codes = frozenset(str(c.code).strip().upper() for c in curricular)
+        names = frozenset(c.name.strip().lower() for c in curricular)
+        views[key] = codes, names, banned_codes, {
+            label: fc for label, fc in st.session_state.free_by_label.items()
+            if str(fc.code).strip().upper() not in codes
+               and fc.name.strip().lower() not in names
+               and str(fc.code).strip().upper() not in banned_codes
+        }
+    return views[key]
+
+
+def _editable_catalog() -> dict:
+    """The session's catalog as plain dicts, copied from the shared template on the first teacher edit."""
+    catalog = st.session_state.catalog
+    if isinstance(catalog, MappingProxyType):
+        catalog = st.session_state.catalog = {main: dict(subs) for main, subs in catalog.items()}
+    return catalog
+
+
+def _editable_free_choice() -> dict:
+    """The session's free-choice registry as a dict, copied from the shared template on the first teacher add."""
+    courses = st.session_state.free_choice_courses
+    if isinstance(courses, MappingProxyType):
+        courses = st.session_state.free_choice_courses = dict(courses)
+    return courses
+
+
+def _sub_path_options(main: str) -> list[str]:
+    """Sub-path dropdown options for `main`, memoized per session until the teacher edits the catalog."""
+    options = st.session_state.setdefault("sub_path_options", {})
+    if main not in options:
+        options[main] = ["Select Sub Path", *st.session_state.catalog[main].keys()]
+    return options[main]
 
 
 # ==================== Document helpers ====================
+# Shared ReportLab styles and A4 table geometry (immutable, built once at import)
+_STYLES = getSampleStyleSheet()
+_BODY = _STYLES["BodyText"]
+_TITLE = ParagraphStyle(name="TitleCenter", parent=_STYLES["Heading2"], alignment=TA_CENTER)
+_CENTER = ParagraphStyle(name="Center", parent=_BODY, alignment=TA_CENTER)
+_BODY_JUST = ParagraphStyle(name="BodyJust", parent=_BODY, alignment=TA_JUSTIFY)
+_HEADER_STYLE = ParagraphStyle(name="TblHeader", parent=_BODY, alignment=TA_CENTER, fontSize=9, leading=11)
+_CELL = ParagraphStyle(name="TblCell", parent=_BODY, fontSize=9, leading=11)
+_CELL_CENTER = ParagraphStyle(name="TblCellCenter", parent=_CELL, alignment=TA_CENTER)
+_APPROVAL_TITLE = ParagraphStyle(name="ApprovalTitle", parent=_STYLES["Heading3"], alignment=TA_CENTER)
+
+# Parse the AFM metrics of every face the PDF uses now, so the first build after start-up doesn't pay for it
+for _face in ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique"):
+    pdfmetrics.getFont(_face)
+del _face
+
+_SIDE_MARGIN = 36
+_AVAIL_W = A4[0] - 2 * _SIDE_MARGIN
+_COL_WIDTHS = tuple(_AVAIL_W * f for f in (0.32, 0.27, 0.15, 0.07, 0.09, 0.10))
+_TABLE_HEADERS = (
+    "Insegnamento", "Corso Di Laurea Da Cui È Offerto", "Codice Insegnamento", "CFU", "Anno", "Semestre",
+)
+_CELL_STYLES = (_CELL, _CELL, _CELL_CENTER, _CELL_CENTER, _CELL_CENTER, _CELL_CENTER)
+
+# (needle, path searched, curriculum shown in the approval section); first match wins
+_CURRICULUM_RULES = (
+    ("INDIVIDUALE", "sub", "Individuale"),
+    ("FUNDAMENTAL SCIENCES", "main", "FUNDAMENTAL SCIENCES"),
+    ("INFORMATION TECHNOLOGIES", "main", "INFORMATION TECHNOLOGIES"),
+    ("PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT", "main", "PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT"),
+    ("ECO", "main", "PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT"),
+    ("INTELLIGENT SYSTEMS", "main", "INTELLIGENT SYSTEMS"),
+)
+
+
+@lru_cache(maxsize=32)
 def academic_year_to_aa_format(academic_year: str) -> str:
     """Convert '2025-2026' -> '2025/26'. If already like '2025/26', return as-is."""
     if "-" in academic_year:
@@ -85,6 +561,31 @@ def academic_year_to_aa_format(academic_year: str) -> str:
     return academic_year
 
 
+@lru_cache(maxsize=256)
+def _parsed_para(text: str, style: ParagraphStyle) -> Paragraph:
+    return Paragraph(text, style)
+
+
+def _static_para(text: str, style: ParagraphStyle) -> Paragraph:
+    """Paragraph for recurring PDF text (fixed copy, course cells): markup is parsed once, each build lays out its own shallow copy."""
+    return copy.copy(_parsed_para(text, style))
+
+
+_PAGE_CENTER = (A4[0] / 2, A4[1] / 2)
+
+
+def draw_watermark(c, _doc, text: str = None):
+    """Page callback: big grey diagonal text across the middle of the page."""
+    if text:
+        c.saveState()
+        c.setFont("Helvetica-Bold", 48)
+        c.setFillColorRGB(0.8, 0.8, 0.8)
+        c.translate(*_PAGE_CENTER)
+        c.rotate(45)
+        c.drawCentredString(0, 0, text)
+        c.restoreState()
+
+
 def build_study_plan_pdf(
         name: str,
         matricula: str,
@@ -98,82 +599,53 @@ def build_study_plan_pdf(
         degree_name: str,
         main_path: str,
         sub_path: str,
-        courses: list,
+        courses: tuple,
         bachelors_degree: str,
         watermark_text: str = None,
-) -> BytesIO:
-    buf = BytesIO()
+        out: IO[bytes] | None = None,
+) -> IO[bytes]:
+    """Render the study plan into `out` (any writable binary sink) or, by default, a new rewound BytesIO."""
+    buf = BytesIO() if out is None else out
     doc = SimpleDocTemplate(
-        buf, pagesize=A4, leftMargin=36, rightMargin=36, topMargin=42, bottomMargin=42
+        buf, pagesize=A4, leftMargin=_SIDE_MARGIN, rightMargin=_SIDE_MARGIN, topMargin=42, bottomMargin=42
     )
-    styles = getSampleStyleSheet()
-    title = ParagraphStyle(name="TitleCenter", parent=styles["Heading2"], alignment=TA_CENTER)
-    center = ParagraphStyle(name="Center", parent=styles["BodyText"], alignment=TA_CENTER)
-    body_just = ParagraphStyle(name="BodyJust", parent=styles["BodyText"], alignment=TA_JUSTIFY)
-
-    def p(text, style=center):
-        return Paragraph(text, style)
 
     aa = academic_year_to_aa_format(academic_year)
 
     story = []
     # Header
-    story.append(p("<b>Università degli Studi di Napoli Federico II</b>", title))
+    story.append(_static_para("<b>Università degli Studi di Napoli Federico II</b>", _TITLE))
     story.append(Spacer(1, 6))
-    story.append(p("Corso di Studio", center))
-    story.append(p(f"<b>Laurea Magistrale in {degree_name}</b>", center))
-    story.append(p("<b>Piano di Studi</b>", center))
-    story.append(p(f"A.A {aa}", center))
+    story.append(_static_para("Corso di Studio", _CENTER))
+    story.append(Paragraph(f"<b>Laurea Magistrale in {degree_name}</b>", _CENTER))
+    story.append(_static_para("<b>Piano di Studi</b>", _CENTER))
+    story.append(Paragraph(f"A.A {aa}", _CENTER))
     story.append(Spacer(1, 6))
-    story.append(p(f"Indirizzo: {sub_path}", center))
-    story.append(p("<i>Da consegnare al Coordinatore del Corso, Prof. Giuseppe Longo</i>", center))
+    story.append(Paragraph(f"Indirizzo: {sub_path}", _CENTER))
+    story.append(_static_para("<i>Da consegnare al Coordinatore del Corso, Prof. Giuseppe Longo</i>", _CENTER))
     story.append(Spacer(1, 10))
 
     # Body
     story.append(Paragraph(
-        "Il/La sottoscritto/a <b>%s</b>, matr. <b>%s</b>, nato/a a <b>%s</b> il <b>%s</b>, cell. <b>%s</b>, e-mail <b>%s</b>" %
-        (name, matricula, pob, dob_str, phone, email),
-        body_just,
+        f"Il/La sottoscritto/a <b>{name}</b>, matr. <b>{matricula}</b>, nato/a a <b>{pob}</b> il <b>{dob_str}</b>, "
+        f"cell. <b>{phone}</b>, e-mail <b>{email}</b>",
+        _BODY_JUST,
     ))
     story.append(Paragraph(
-        "iscritto/a nell’A.A. <b>%s</b> al <b>%s</b> anno del Corso di <b>%s</b> in <b>%s</b>, chiede alla Commissione di Coordinamento Didattico del Corso di Studio l’approvazione del presente Piano di Studio (PdS)." %
-        (aa, year_of_degree, degree_type, degree_name),
-        body_just,
+        f"iscritto/a nell’A.A. <b>{aa}</b> al <b>{year_of_degree}</b> anno del Corso di <b>{degree_type}</b> "
+        f"in <b>{degree_name}</b>, chiede alla Commissione di Coordinamento Didattico del Corso di Studio "
+        "l’approvazione del presente Piano di Studio (PdS).",
+        _BODY_JUST,
     ))
     story.append(Spacer(1, 6))
-    story.append(Paragraph(
-        "Studente/Studentessa della Laurea Triennale: <b>%s</b>" % (bachelors_degree,),
-        body_just,
-    ))
+    story.append(Paragraph(f"Studente/Studentessa della Laurea Triennale: <b>{bachelors_degree}</b>", _BODY_JUST))
     story.append(Spacer(1, 8))
 
     # Table 6x8
-    page_w, _ = A4
-    avail_w = page_w - doc.leftMargin - doc.rightMargin
-    col_widths = [avail_w * 0.32, avail_w * 0.27, avail_w * 0.15, avail_w * 0.07, avail_w * 0.09, avail_w * 0.10]
-    header_style = ParagraphStyle(name="TblHeader", parent=styles["BodyText"], alignment=TA_CENTER, fontSize=9, leading=11)
-    cell = ParagraphStyle(name="TblCell", parent=styles["BodyText"], fontSize=9, leading=11)
-    cell_center = ParagraphStyle(name="TblCellCenter", parent=cell, alignment=TA_CENTER)
-
-    data = [[
-        Paragraph("Insegnamento", header_style),
-        Paragraph("Corso Di Laurea Da Cui È Offerto", header_style),
-        Paragraph("Codice Insegnamento", header_style),
-        Paragraph("CFU", header_style),
-        Paragraph("Anno", header_style),
-        Paragraph("Semestre", header_style),
-    ]]
-    for c in courses[:7]:
-        data.append([
-            Paragraph(c["name"], cell),
-            Paragraph(c["dept"], cell),
-            Paragraph(str(c["code"]), cell_center),
-            Paragraph(str(c["cfu"]), cell_center),
-            Paragraph(str(c["year"]), cell_center),
-            Paragraph(str(c["semester"]), cell_center),
-        ])
-
-    tbl = PDFTable(data, colWidths=col_widths, repeatRows=1)
+    data = [[_static_para(h, _HEADER_STYLE) for h in _TABLE_HEADERS]]
+    data.extend([_static_para(text, style) for text, style in zip(c.cells, _CELL_STYLES)] for c in courses[:7])
+
+    tbl = PDFTable(data, colWidths=list(_COL_WIDTHS), repeatRows=1)
     tbl.setStyle(TableStyle([
         ("GRID", (0,0), (-1,-1), 0.5, colors.black),
         ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
@@ -184,18 +656,18 @@ def build_study_plan_pdf(
     story.append(tbl)
     story.append(Spacer(1, 20))
 
-    story.append(Paragraph("<b>Modalità di compilazione:</b>", styles["BodyText"]))
+    story.append(_static_para("<b>Modalità di compilazione:</b>", _BODY))
     bullets = [
         "Si possono includere nel PdS sia insegnamenti consigliati dal Corso di Studio (elencati e di immediata approvazione) sia insegnamenti offerti presso l’Ateneo (riportare nome insegnamento, codice esame, Corso di Studio) purchè costituiscano un percorso didattico complementare, coerente con il Corso di Studio",
         "É ammesso il superamento del numero dei CFU previsti",
     ]
     for b in bullets:
-        story.append(Paragraph(b, body_just))
+        story.append(_static_para(b, _BODY_JUST))
     story.append(Spacer(1, 15))
 
     # Signature row
     sig = PDFTable([[f"Napoli ({date.today().strftime('%d/%m/%Y')})", "firma dello studente"]],
-                   colWidths=[avail_w * 0.5, avail_w * 0.5])
+                   colWidths=[_AVAIL_W * 0.5, _AVAIL_W * 0.5])
     sig.setStyle(TableStyle([
         ("ALIGN", (0,0), (0,0), "LEFT"),
         ("ALIGN", (1,0), (1,0), "RIGHT"),
@@ -207,41 +679,33 @@ def build_study_plan_pdf(
     ]))
     story.append(sig)
 
-    approval_title = ParagraphStyle(name="ApprovalTitle", parent=styles["Heading3"], alignment=TA_CENTER)
-
-    mp_upper = (main_path or "").upper()
-    sp_upper = (sub_path or "").upper()
-    if "INDIVIDUALE" in sp_upper:
-        curriculum_disp = "Individuale"
-    elif "FUNDAMENTAL SCIENCES" in mp_upper:
-        curriculum_disp = "FUNDAMENTAL SCIENCES"
-    elif "INFORMATION TECHNOLOGIES" in mp_upper:
-        curriculum_disp = "INFORMATION TECHNOLOGIES"
-    elif "PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT" in mp_upper or "ECO" in mp_upper:
-        curriculum_disp = "PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT"
-    elif "INTELLIGENT SYSTEMS" in mp_upper:
-        curriculum_disp = "INTELLIGENT SYSTEMS"
+    main_path = main_path or ""
+    paths_upper = {"main": main_path.upper(), "sub": (sub_path or "").upper()}
+    for needle, which, label in _CURRICULUM_RULES:
+        if needle in paths_upper[which]:
+            curriculum_disp = label
+            break
     else:
-        curriculum_disp = (main_path or "").replace("Curriculum ", "").strip() or "Individuale"
+        curriculum_disp = main_path.replace("Curriculum ", "").strip() or "Individuale"
 
     story.append(Spacer(1, 14))
-    story.append(Paragraph("Valutazione Piano di Studi", approval_title))
+    story.append(_static_para("Valutazione Piano di Studi", _APPROVAL_TITLE))
     story.append(Spacer(1, 10))
-    story.append(Paragraph(
+    story.append(_static_para(
         "La Commissione di Coordinamento Didattico ... approva il Piano di Studi presentato dallo studente",
-        body_just,
+        _BODY_JUST,
     ))
     story.append(Spacer(1, 3))
-    story.append(Paragraph(f"<b>MATRICOLA NOME COMPLETO:</b> {matricula} {name}", styles["BodyText"]))
+    story.append(Paragraph(f"<b>MATRICOLA NOME COMPLETO:</b> {matricula} {name}", _BODY))
     story.append(Spacer(1, 8))
-    story.append(Paragraph("per l’iscrizione al Secondo Anno della LM – Data Science con il curriculum:", styles["BodyText"]))
-    story.append(Paragraph(f"<b>{curriculum_disp}</b>", styles["BodyText"]))
+    story.append(_static_para("per l’iscrizione al Secondo Anno della LM – Data Science con il curriculum:", _BODY))
+    story.append(Paragraph(f"<b>{curriculum_disp}</b>", _BODY))
     story.append(Spacer(1, 18))
 
     sig_comm = PDFTable([
-        [Paragraph("Napoli, ___/___/2025", styles["BodyText"]),
-         Paragraph("Prof. Giuseppe Longo  —  The Coordinator of Ms Data Science", styles["BodyText"])]
-    ], colWidths=[avail_w * 0.45, avail_w * 0.55])
+        [_static_para("Napoli, ___/___/2025", _BODY),
+         _static_para("Prof. Giuseppe Longo  —  The Coordinator of Ms Data Science", _BODY)]
+    ], colWidths=[_AVAIL_W * 0.45, _AVAIL_W * 0.55])
     sig_comm.setStyle(TableStyle([
         ("ALIGN", (0,0), (-1,-1), "LEFT"),
         ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
@@ -252,26 +716,69 @@ def build_study_plan_pdf(
     ]))
     story.append(sig_comm)
 
-    # Lint-proof capture of watermark_text
-    def _watermark(c, _doc, wm_text=watermark_text):
-        if wm_text:
-            w, h = A4
-            c.saveState()
-            c.setFont("Helvetica-Bold", 48)
-            c.setFillColorRGB(0.8, 0.8, 0.8)
-            c.translate(w/2, h/2)
-            c.rotate(45)
-            c.drawCentredString(0, 0, wm_text)
-            c.restoreState()
-
-    doc.build(story, onFirstPage=_watermark, onLaterPages=_watermark)
-    buf.seek(0)
+    # No watermark: keep ReportLab's no-op page hooks instead of a per-page call that draws nothing
+    page_hooks = {}
+    if watermark_text:
+        _watermark = partial(draw_watermark, text=watermark_text)
+        page_hooks = {"onFirstPage": _watermark, "onLaterPages": _watermark}
+    doc.build(story, **page_hooks)
+    if out is None:
+        buf.seek(0)
     return buf
 
+
+# In memory only: the PDFs carry student personal data, which must not be pickled to disk
+@st.cache_data(max_entries=64, show_spinner=False)
+def study_plan_pdf_bytes(issued_on: str, **fields) -> bytes:
+    """Memoized build_study_plan_pdf(**fields) bytes; `issued_on` (today's date) keys the signature date."""
+    return build_study_plan_pdf(**fields).getvalue()
+
+
+@st.cache_resource
+def _secrets() -> MappingProxyType:
+    """Receiver and teacher credentials, read from st.secrets once per process (restart to pick up edits)."""
+    keys = ("RECEIVER_URL", "GS_API_KEY", "TEACHER_ID", "TEACHER_PASS")
+    return MappingProxyType({k: st.secrets.get(k) for k in keys})
+
+
+def _teacher_credentials_ok(teacher_id: str, teacher_pass: str) -> bool:
+    """Constant-time check of the sidebar login against TEACHER_ID / TEACHER_PASS (never matches if unset)."""
+    secrets = _secrets()
+    cfg_id, cfg_pass = secrets["TEACHER_ID"], secrets["TEACHER_PASS"]
+    if not cfg_id or not cfg_pass:
+        return False
+    # Evaluate both digests so a wrong ID takes as long as a wrong password
+    id_ok = hmac.compare_digest(teacher_id.encode(), str(cfg_id).encode())
+    pass_ok = hmac.compare_digest(teacher_pass.encode(), str(cfg_pass).encode())
+    return id_ok and pass_ok
+
+
 # --- Apps Script sender (uses your Streamlit secrets) ---
-def send_to_google(pdf_bytes: bytes, filename: str, student: dict, meta: dict) -> dict:
-    url = st.secrets.get("RECEIVER_URL")
-    api_key = st.secrets.get("GS_API_KEY")
+# One keep-alive session for all uploads: repeat submits reuse the TLS connection
+_UPLOAD_TIMEOUT = 30  # seconds, applied to both connect and read
+_UPLOAD_RETRY = Retry(total=2, backoff_factor=0.3)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=_UPLOAD_RETRY))
+# Body is pre-encoded with orjson (much faster than stdlib json on the ~MB base64 string)
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@st.cache_resource
+def _upload_pool() -> ThreadPoolExecutor:
+    """Process-wide workers for Apps Script uploads, sized to the _SESSION connection pool."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="gs-upload")
+
+
+def _keep_upload_reply(into: dict, fut) -> None:
+    """Done-callback for a pooled upload: copy the receiver's reply into `into` (a plain dict; no Streamlit calls)."""
+    try:
+        into.update(fut.result())
+    except Exception:
+        pass  # a failed upload just leaves no Drive link
+
+
+def send_to_google(pdf_bytes: bytes, filename: str, student: dict, meta: dict, url: str, api_key: str) -> dict:
+    # url / api_key are read from _secrets() by the caller: this runs on a pool thread, away from Streamlit
     if not url or not api_key:
         return {"ok": False, "error": "Missing RECEIVER_URL / GS_API_KEY in secrets"}
 
@@ -284,7 +791,7 @@ def send_to_google(pdf_bytes: bytes, filename: str, student: dict, meta: dict) -
     }
 
     try:
-        r = requests.post(url, json=payload, timeout=30)
+        r = _SESSION.post(url, data=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=_UPLOAD_TIMEOUT)
     except Exception as e:
         return {"ok": False, "error": f"request_failed: {e}"}
 
@@ -300,193 +807,40 @@ def send_to_google(pdf_bytes: bytes, filename: str, student: dict, meta: dict) -
         # Most common case: HTML login/permission page or empty body
         return {"ok": False, "error": f"non_json_response ({r.status_code}): {text[:200]!r}"}
 
-    styles = getSampleStyleSheet()
-    title = ParagraphStyle(name="TitleCenter", parent=styles["Heading2"], alignment=TA_CENTER)
-    center = ParagraphStyle(name="Center", parent=styles["BodyText"], alignment=TA_CENTER)
-    body_just = ParagraphStyle(name="BodyJust", parent=styles["BodyText"], alignment=TA_JUSTIFY)
-
-    def p(text, style=center):
-        return Paragraph(text, style)
-
-    aa = academic_year_to_aa_format(academic_year)
-
-    story = []
-    # Header
-    story.append(p("<b>Università degli Studi di Napoli Federico II</b>", title))
-    story.append(Spacer(1, 6))
-    story.append(p("Corso di Studio", center))
-    story.append(p(f"<b>Laurea Magistrale in {degree_name}</b>", center))
-    story.append(p("<b>Piano di Studi</b>", center))
-    story.append(p(f"A.A {aa}", center))
-    story.append(Spacer(1, 6))
-    story.append(p(f"Indirizzo: {sub_path}", center))
-    story.append(p("<i>Da consegnare al Coordinatore del Corso, Prof. Giuseppe Longo</i>", center))
-    story.append(Spacer(1, 10))
-
-    # Body text with bold fields
-    story.append(Paragraph(
-        "Il/La sottoscritto/a <b>%s</b>, matr. <b>%s</b>, nato/a a <b>%s</b> il <b>%s</b>, cell. <b>%s</b>, e-mail <b>%s</b>" % (
-        name, matricula, pob, dob_str, phone, email),
-        body_just,
-    ))
-    story.append(Paragraph(
-        "iscritto/a nell’A.A. <b>%s</b> al <b>%s</b> anno del Corso di <b>%s</b> in <b>%s</b>, chiede alla Commissione di Coordinamento Didattico del Corso di Studio l’approvazione del presente Piano di Studio (PdS)." % (
-        aa, year_of_degree, degree_type, degree_name),
-        body_just,
-    ))
-    story.append(Spacer(1, 6))
-    # Bachelor's line (before the table)
-    story.append(Paragraph(
-        "Studente/Studentessa della Laurea Triennale: <b>%s</b>" % (bachelors_degree,),
-        body_just,
-    ))
-    story.append(Spacer(1, 8))
-
-    # Table 6x8 (1 header + 7 rows)
-    page_w, _ = A4
-    avail_w = page_w - doc.leftMargin - doc.rightMargin
-    col_widths = [
-        avail_w * 0.32,  # Insegnamento
-        avail_w * 0.27,  # Offerto da
-        avail_w * 0.15,  # Codice
-        avail_w * 0.07,  # CFU
-        avail_w * 0.09,  # Anno
-        avail_w * 0.10,  # Semestre
-    ]
-
-    header_style = ParagraphStyle(name="TblHeader", parent=styles["BodyText"], alignment=TA_CENTER, fontSize=9,
-                                  leading=11)
-    cell = ParagraphStyle(name="TblCell", parent=styles["BodyText"], fontSize=9, leading=11)
-    cell_center = ParagraphStyle(name="TblCellCenter", parent=cell, alignment=TA_CENTER)
-
-    data = [[
-        Paragraph("Insegnamento", header_style),
-        Paragraph("Corso Di Laurea Da Cui È Offerto", header_style),
-        Paragraph("Codice Insegnamento", header_style),
-        Paragraph("CFU", header_style),
-        Paragraph("Anno", header_style),
-        Paragraph("Semestre", header_style),
-    ]]
-
-    for c in courses[:7]:
-        data.append([
-            Paragraph(c["name"], cell),
-            Paragraph(c["dept"], cell),
-            Paragraph(c["code"], cell_center),
-            Paragraph(str(c["cfu"]), cell_center),
-            Paragraph(str(c["year"]), cell_center),
-            Paragraph(str(c["semester"]), cell_center),
-        ])
-
-    tbl = PDFTable(data, colWidths=col_widths, repeatRows=1)
-    tbl.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-    ]))
-    story.append(tbl)
-    story.append(Spacer(1, 20))
 
-    story.append(Paragraph("<b>Modalità di compilazione:</b>", styles["BodyText"]))
-    bullets = [
-        "Si possono includere nel PdS sia insegnamenti consigliati dal Corso di Studio (elencati e di immediata approvazione) sia insegnamenti offerti presso l’Ateneo (riportare nome insegnamento, codice esame, Corso di Studio) purchè costituiscano un percorso didattico complementare, coerente con il Corso di Studio",
-        "É ammesso il superamento del numero dei CFU previsti",
-    ]
-    for b in bullets:
-        story.append(Paragraph(b, body_just))
+def short_code_from_subpath(label: str) -> str:
+    """
+    Extracts short code (e.g., 'ITE/TS', 'ECO', 'ISY', 'FSE/PH') from a sub-path label,
+    which typically looks like 'PDS ITE/TS - CURRICULUM ...'. Empty labels give 'PLAN'.
+    """
+    if not label:
+        return "PLAN"
+    # drop any " — Piano di Studi Individuale" suffix, then keep the part before " - "
+    head = label.partition(" — ")[0].partition(" - ")[0].strip()
+    # strip optional "PDS " prefix
+    if head[:4].upper() == "PDS ":
+        head = head[4:].strip()
+    return head
 
-    story.append(Spacer(1, 15))
 
-    # Signature row as 2-col table, left/right aligned on a single line
-    sig = PDFTable(
-        [[f"Napoli ({date.today().strftime('%d/%m/%Y')})", "firma dello studente"]],
-        colWidths=[avail_w * 0.5, avail_w * 0.5],
-    )
-    sig.setStyle(TableStyle([
-        ("ALIGN", (0, 0), (0, 0), "LEFT"),
-        ("ALIGN", (1, 0), (1, 0), "RIGHT"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("LEFTPADDING", (0, 0), (-1, -1), 0),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 0),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 0),
-    ]))
-    story.append(sig)
+class _FilenameTable(dict):
+    """str.translate table for file names: keeps alphanumerics and '._-', maps any other character to '_'.
 
-    approval_title = ParagraphStyle(name="ApprovalTitle", parent=styles["Heading3"], alignment=TA_CENTER)
-
-    mp_upper = (main_path or "").upper()
-    sp_upper = (sub_path or "").upper()
-    if "INDIVIDUALE" in sp_upper:
-        curriculum_disp = "Individuale"
-    elif "FUNDAMENTAL SCIENCES" in mp_upper:
-        curriculum_disp = "FUNDAMENTAL SCIENCES"
-    elif "INFORMATION TECHNOLOGIES" in mp_upper:
-        curriculum_disp = "INFORMATION TECHNOLOGIES"
-    elif "PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT" in mp_upper or "ECO" in mp_upper:
-        curriculum_disp = "PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT"
-    elif "INTELLIGENT SYSTEMS" in mp_upper:
-        curriculum_disp = "INTELLIGENT SYSTEMS"
-    else:
-        curriculum_disp = (main_path or "").replace("Curriculum ", "").strip() or "Individuale"
+    Filled lazily per code point, so str.isalnum() keeps its Unicode meaning.
+    """
 
-    story.append(Spacer(1, 14))
-    story.append(Paragraph("Valutazione Piano di Studi", approval_title))
-    story.append(Spacer(1, 10))
-    story.append(Paragraph(
-        "La Commissione di Coordinamento Didattico della LM Data Science presieduta dal coordinatore, Prog. Giuseppe Longo, dopo attenta valutazione, approva il Piano di Studi presentato dallo studente",
-        body_just,
-    ))
-    story.append(Spacer(1, 3))
-    story.append(Paragraph(f"<b>MATRICOLA NOME COMPLETO:</b> {matricula} {name}", styles["BodyText"]))
-    story.append(Spacer(1, 8))
-    story.append(Paragraph(
-        "per l’iscrizione al Secondo Anno della LM – Data Science con il curriculum:",
-        styles["BodyText"],
-    ))
-    story.append(Paragraph(f"<b>{curriculum_disp}</b>", styles["BodyText"]))
-    story.append(Spacer(1, 18))
+    def __missing__(self, cp: int) -> str:
+        ch = chr(cp)
+        out = self[cp] = ch if ch.isalnum() or ch in "._-" else "_"
+        return out
 
-    sig_comm = PDFTable(
-        [[
-            Paragraph("Napoli, ___/___/2025", styles["BodyText"]),
-            Paragraph("Prof. Giuseppe Longo  —  The Coordinator of Ms Data Science", styles["BodyText"]),
-        ]],
-        colWidths=[avail_w * 0.45, avail_w * 0.55],
-    )
-    sig_comm.setStyle(TableStyle([
-        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("LEFTPADDING", (0, 0), (-1, -1), 0),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 0),
-        ("TOPPADDING", (0, 0), (-1, -1), 4),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 0),
-    ]))
-    story.append(sig_comm)
 
-    def _watermark(c, _doc, wm_text=watermark_text):
-        if wm_text:
-            w, h = A4
-            c.saveState()
-            c.setFont("Helvetica-Bold", 48)
-            c.setFillColorRGB(0.8, 0.8, 0.8)
-            c.translate(w / 2, h / 2)
-            c.rotate(45)
-            c.drawCentredString(0, 0, wm_text)
-            c.restoreState()
-
-    doc.build(story, onFirstPage=_watermark, onLaterPages=_watermark)
-    buf.seek(0)
-    return buf
+_FILENAME_TABLE = _FilenameTable()
 
 
-# ==================== App ====================
-def main():
-    st.set_page_config(page_title="Master's Study Plan", page_icon="🎓", layout="wide")
-    st.markdown(
-        """
+# Static page markup. It must be re-emitted on every rerun (Streamlit drops elements a run does not
+# write), so it lives here as plain constants instead of being rebuilt inside main().
+_APP_CSS = """
         <style>
           .title {text-align: center; color: #4CAF50;}
           .sidebar .sidebar-content {background-color: #f0f2f6;}
@@ -523,19 +877,9 @@ def main():
             box-shadow: none;
           }
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
-    st.title("🎓 Master's Study Plan Generator")
-
-    # --- one-time init to prevent rapid re-clicks ---
-    if "submitting_pdf" not in st.session_state:
-        st.session_state.submitting_pdf = False
-
-    # --- Privacy notice (dark-mode friendly) ---
-    st.markdown(
         """
+
+_PRIVACY_NOTICE_HTML = """
         <style>
           .card-privacy {
             margin-top:0.5rem;
@@ -564,9 +908,22 @@ def main():
             The PDF you download/submit may be retained by the University/Coordinator for academic administration.
           </div>
         </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+
+# ==================== App ====================
+def main():
+    st.set_page_config(page_title="Master's Study Plan", page_icon="🎓", layout="wide")
+    st.markdown(_APP_CSS, unsafe_allow_html=True)
+
+    st.title("🎓 Master's Study Plan Generator")
+
+    # --- one-time init to prevent rapid re-clicks ---
+    if "submitting_pdf" not in st.session_state:
+        st.session_state.submitting_pdf = False
+
+    # --- Privacy notice (dark-mode friendly) ---
+    st.markdown(_PRIVACY_NOTICE_HTML, unsafe_allow_html=True)
     with st.expander("Details"):
         st.markdown(
             """
@@ -582,323 +939,50 @@ def main():
         teacher_id = st.text_input("Enter ID:", type="password")
         teacher_pass = st.text_input("Enter Password:", type="password")
 
-        cfg_id = st.secrets.get("TEACHER_ID")
-        cfg_pass = st.secrets.get("TEACHER_PASS")
-
         teacher_logged_in = False
-        if teacher_id and teacher_pass and teacher_id == cfg_id and teacher_pass == cfg_pass:
+        if teacher_id and teacher_pass and _teacher_credentials_ok(teacher_id, teacher_pass):
             teacher_logged_in = True
             st.success("✅ Logged in successfully!")
 
     # -------------------- Predefined catalog --------------------
-    if "catalog" not in st.session_state:
-        st.session_state.catalog = {
-            "Curriculum FUNDAMENTAL SCIENCES": {
-                "FSE/PH - CURRICULUM FUNDAMENTAL SCIENCES/PHYSICS INSPIRED METHODOLOGIES": [
-                    make_course(
-                        "Advanced Statistical Learning and Modeling",
-                        "U5450", 12, "DIETI – LM Data Science", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Physics Informed Machine Learning",
-                        "U****", 6, "DIETI - LM Data Science", "Second", "second",
-                        links=[],
-                    ),
-                ],
-                "PDS FSE/MM - CURRICULUM FUNDAMENTAL SCIENCES/MATHEMATICAL METHODOLOGIES": [
-                    make_course(
-                        "Algorithms and Parallel Computing and Computational Complexity",
-                        "U5430", 12, "DMRC - LM Ing. Matematica D71", "Second", "first&second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e49454c4c4f4d5552414e4f4d524e4e4c4c3731543230493037334c/schede_insegnamento",
-                            "https://www.docenti.unina.it/#!/professor/4749554c49414e4f4c414343455454494c4343474c4e3534443233463833394c/schede_insegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Operational Research",
-                        "U1624", 6, "DMRC - LM Ing. Matematica D71", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/44414e49454c454645524f4e4546524e444e4c38355232384638333944/programmi/shedainsegnamento",
-                        ],
-                    ),
-                ],
-            },
-            "Curriculum INFORMATION TECHNOLOGIES": {
-                "PDS ITE/TS - CURRICULUM INFORMATION TECHNOLOGIES/TEXT AND SPEECH PROCESSING": [
-                    make_course(
-                        "Multimedia Information Retrieval and Text Mining",
-                        "U5441", 12, "DIETI – LM Data Science", "Second", "first&second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e544f4e494f204d4152494152494e414c4449524e4c4e4e4d37355232374239363359/schede_insegnamento",
-                            "https://www.docenti.unina.it/#!/professor/414e4e41434f52415a5a4143525a4e4e4136344c35374c37383144/schede_insegnamento",
-                        ],
-                    ),
-                    # UPDATED: Curricular II is Speech Processing (6 CFU)
-                    make_course(
-                        "Speech Processing",
-                        "U6636", 6, "DIETI – LM Data Science", "Second", "second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/schede_insegnamento",
-                        ],
-                    ),
-                ],
-                "PDS ITE/SV - CURRICULUM INFORMATION TECHNOLOGIES/SIGNAL AND VIDEO PROCESSING": [
-                    make_course(
-                        "Information Theory and Signals Theory",
-                        "U5444", 12, "DMRC - LM Ing. Matematica D71", "Second", "first&second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e544f4e4941204d4152494154554c494e4f544c4e4e4e4d3731503532463833394e/programmi/programma",
-                            "https://www.docenti.unina.it/#!/professor/4d4152494f54414e4441544e444d524136334c31354135313246/programmi/shedainsegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Image and Video Processing for Autonomous Driving",
-                        "U3423", 6, "DII - LM Autonomous Vehicle Engineering", "Second", "second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/4c55495341564552444f4c4956415652444c535537324d36324c38343551/programmi/shedainsegnamento",
-                        ],
-                    ),
-                ],
-                "PDS ITE/RS - CURRICULUM INFORMATION TECHNOLOGIES/ STATISTICS AND ROBOTICS FOR HEALTH": [
-                    make_course(
-                        "Advanced Statistical Learning and Modeling",
-                        "U5450", 12, "DMRC - DIETI – LM Data Science", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Robotics for Bioengineering",
-                        "U1579", 6, "LM Ing. Automazione e Robotica", "Second", "second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/46414e4e59464943554349454c4c4f464343464e5937345236304639313248/programmi/shedainsegnamento",
-                        ],
-                    ),
-                ],
-                "PDS ITE/IA - CURRICULUM INFORMATION TECHNOLOGIES/INDUSTRIAL APPLICATIONS": [
-                    make_course(
-                        "Advanced Statistical Learning and Modeling",
-                        "U5450", 12, "DMRC - DIETI – LM Data Science", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Statistical Methods for Industrial Process Monitoring",
-                        "U2659", 6, "DMRC - LM Ing. Matematica D71", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e544f4e494f4c45504f52454c50524e544e37394c32374137383353/programmi/programma",
-                        ],
-                    ),
-                ],
-                "PDS ITE/AI - CURRICULUM INFORMATION TECHNOLOGIES/DATA SECURITY": [
-                    make_course(
-                        "Data Security and Computer Forensics",
-                        "U5447", 12, "DMRC - DIETI – LM Informatica", "Second", "second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/524f424552544f4e4154454c4c414e544c52525438334c32334637393953/schede_insegnamento",
-                            "https://www.docenti.unina.it/#!/professor/4c4f52454e5a4f4c41555241544f4c52544c4e5a37304332325a3133335a/programmi/shedainsegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Algorithm Design",
-                        "U3524", 6, "DIETI – LM Data Science", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/464142494f4d4f47415645524f4d475646424138334533314837303341/programmi/shedainsegnamento",
-                        ],
-                    ),
-                ],
-            },
-            "Curriculum PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT – ECO": {
-                "PDS ECO - CURRICULUM PUBLIC ADMINISTRATION, ECONOMY AND MANAGEMENT": [
-                    make_course(
-                        "Computational Statistical and Generalized Linear Models",
-                        "U5453", 12, "DIETI – LM Data Science", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e544f4e494f4427414d42524f53494f444d424e544e3730533239413738334e/schede_insegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Financial Time Series Analysis",
-                        "U6373", 6, "DISES – LM Economics and Finance DH5", "Second", "first",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/4341524d454c41494f52494f52494f434d4c38354336324638333951/schede_insegnamento",
-                        ],
-                    ),
-                ],
-            },
-            "Curriculum INTELLIGENT SYSTEMS - ISY": {
-                "PDS ISY - CURRICULUM INTELLIGENT SYSTEMS": [
-                    # UPDATED: Department is LM Physics only
-                    make_course(
-                        "Computational Intelligence and Machine Learning for Physics",
-                        "U5460", 12, "DFEP – LM Physics", "Second", "second",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/46455244494e414e444f4449204d415254494e4f444d5246444e3635433235463833394b/programmi/shedainsegnamento",
-                        ],
-                    ),
-                    make_course(
-                        "Generative Artificial Intelligence",
-                        "U7215", 6, "DIETI – LM Data Science", "Second", "first",
-                        links=[],
-                    ),
-                ],
-            },
-        }
+    if not st.session_state.get("_inited"):
+        # Sessions share the read-only templates; teacher tools copy on first write (_editable_*)
+        st.session_state.catalog = build_default_catalog()
+        st.session_state.free_choice_courses = build_free_choice_courses()
+        _refresh_free_index()
 
-    if "specializations" in st.session_state and isinstance(st.session_state["specializations"], dict):
-        it = st.session_state.catalog.get("Curriculum INFORMATION TECHNOLOGIES", {})
-        it.update(st.session_state.specializations)
-        st.session_state.catalog["Curriculum INFORMATION TECHNOLOGIES"] = it
-        del st.session_state["specializations"]
-
-    if "free_choice_courses" not in st.session_state:
-        st.session_state.free_choice_courses = [
-            make_course("Advanced Statistical Learning and Modeling", "U5450", 12, "DIETI – LM Data Science", "Second",
-                        "I", links=[
-                    "https://www.docenti.unina.it/#!/professor/524f4245525441534943494c49414e4f53434c52525436344535324638333953/schede_insegnamento"]),
-            make_course("AI Systems Engineering", "U5494", 6, "DIETI – LM Ing. Informatica", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/524f424552544f5049455452414e54554f4e4f50545252525438305332344632323448/programmi/shedainsegnamento"]),
-            make_course("Astroinformatics", "U1205", 6, "DFEP – LM Fisica", "Second", "II", links=[
-                "https://www.docenti.unina.it/#!/professor/53544546414e4f434156554f544943565453464e38324130374837303359/programmi"]),
-            make_course("Biometric Systems", "U3525", 6, "DIETI – LM Informatica", "Second", "II", links=[
-                "https://www.docenti.unina.it/#!/professor/44414e49454c52494343494f524343444e4c37384831365a3131344d/programmi"]),
-            make_course("Computational Intelligence", "U7219", 6, "DIETI – LM Data Science", "Second", "II", links=[
-                "https://www.docenti.unina.it/#!/professor/46455244494e414e444f4449204d415254494e4f444d5246444e3635433235463833394b/programmi/shedainsegnamento"]),
-            make_course("Computational Statistical and Generalized Linear Models", "U5453", 12,
-                        "DIETI – LM Data Science", "Second", "I", links=[
-                    "https://www.docenti.unina.it/#!/professor/414e544f4e494f4427414d42524f53494f444d424e544e3730533239413738334e/schede_insegnamento"]),
-            make_course("Computer Vision", "U3523", 6, "DIETI – LM Informatica", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/4652414e434553434f495347524f27534752464e4336365432364732373341/programmi/shedainsegnamento"]),
-            make_course("Data Security", "U2652", 6, "DIETI – LM Data Science", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/524f424552544f4e4154454c4c414e544c52525438334c32334637393953/programmi/shedainsegnamento"]),
-            make_course("Data Visualization", "U2658", 6, "DIETI – LM Data Science", "Second", "II", links=[
-                "https://www.docenti.unina.it/#!/professor/524f424552544f5049455452414e54554f4e4f50545252525438305332344632323448/programmi/shedainsegnamento"]),
-            make_course("Generative Artificial Intelligence", "U7215", 6, "DIETI – LM Data Science", "Second", "I",
-                        links=[]),
-            make_course("Financial Time Series Analysis", "U6373", 6, "DISES – LM Econ. and Finance", "Second", "I",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/4341524d454c41494f52494f52494f434d4c38354336324638333951/schede_insegnamento"]),
-            make_course("Human robot interaction", "U3536", 6, "DIETI – LM Informatica", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/53494c564941524f535349525353534c563737453536423936334e/programmi/shedainsegnamento"]),
-            make_course("Image and Video Processing for Autonomous Driving", "U3423", 6,
-                        "DII - LM Autonomous Vehicle Engineering", "Second", "II", links=[
-                    "https://www.docenti.unina.it/#!/professor/4c55495341564552444f4c4956415652444c535537324d36324c38343551/programmi/shedainsegnamento"]),
-            make_course("Information Systems and Business Intelligence", "U3546", 6, "DIETI – LM Ing. Informatica",
-                        "Second", "I", links=[
-                    "https://www.docenti.unina.it/#!/professor/464c4f5241414d41544f4d5441464c5237395036314c3235394c/schede_insegnamento"]),
-            make_course("Information Theory", "U1644", 6, "DMRC - LM Ing. Matematica", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/414e544f4e4941204d4152494154554c494e4f544c4e4e4e4d3731503532463833394e/schede_insegnamento"]),
-            make_course("Methods for Artificial Intelligence", "U3522", 6, "DIETI – LM Informatica", "Second", "II",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/53494c564941524f535349525353534c563737453536423936334e/programmi/shedainsegnamento"]),
-            make_course("Natural Language Processing", "U3539", 6, "DIETI – LM Informatica", "Second", "II", links=[
-                "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/programmi/shedainsegnamento"]),
-            make_course("Physics Informed Machine Learning", "NI", 6, "DIETI – LM Data Science", "Second", "II",
-                        links=[]),
-            make_course("Preference learning", "U6641", 6, "DISES – LM Economia e Commercio", "Second", "I", links=[]),
-            make_course("Reliability and Risk in Aerospace Engineering", "U3835", 6, "DII – LM Ing. Aerospaziale",
-                        "Second", "II", links=[
-                    "https://www.docenti.unina.it/#!/professor/4d415353494d494c49414e4f47494f5247494f4752474d534d3636523133463833394d/programmi/shedainsegnamento"]),
-            make_course("Robotics Lab", "U2325", 6, "DIETI – LM Ing. Automazione e Robotica", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/4a4f4e415448414e4341434143454343434a544838375431334638333949/programmi/programma"]),
-            make_course("Software Architecture Design", "U5937", 6, "DIETI – LM Ing. Informatica", "Second", "I",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e4e4120524954414641534f4c494e4f46534c4e525436355334374639313245/schede_insegnamento"]),
-            make_course("Speech Processing", "U6636", 6, "DIETI – LM Data Science", "Second", "II", links=[
-                "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/schede_insegnamento"]),
-            make_course("Statistical Methods for Industrial Process Monitoring", "U2659", 6,
-                        "DMRC - LM Ing. Matematica", "Second", "I", links=[
-                    "https://www.docenti.unina.it/#!/professor/414e544f4e494f4c45504f52454c50524e544e37394c32374137383353/programmi/programma"]),
-            make_course("SW and methods for statistical analysis of economic data", "U6640", 6,
-                        "DIETI – LM Data Science", "Second", "II", links=[
-                    "https://www.docenti.unina.it/#!/professor/414c464f4e534f494f44494345204427454e5a414443444c4e5337374c31384638333946/schede_insegnamento"]),
-            make_course("Techniques of Text Analysis and Computational Linguistic", "U6635", 6,
-                        "DIETI – LM Data Science", "Second", "I", links=[
-                    "https://www.docenti.unina.it/#!/professor/4652414e434553434f43555455474e4f435447464e4336304d31364638333948/programmi/shedainsegnamento"]),
-            make_course("Text Mining", "U5902", 6, "DIETI – LM Data Science", "Second", "I", links=[
-                "https://www.docenti.unina.it/#!/professor/414e4e41434f52415a5a4143525a4e4e4136344c35374c37383144/schede_insegnamento"]),
-            make_course("Advanced Microeconomics", "25880", 12, "DISES – LM Economics and Finance", "Second", "I",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/47494f56414e4e49494d4d4f5244494e4f4d4d52474e4e36394530384732373359/programmi/programma"]),
-            make_course("Advanced Macroeconomics", "25881", 12, "DISES – LM Economics and Finance", "Second", "II",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/54554c4c494f4a415050454c4c494a5050544c4c35365032324638333955/programmi/shedainsegnamento"]),
-            make_course("Economics of Regulation", "27381", 6, "DISES – LM Economics and Finance", "Second", "II",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/4d4152434f5041474e4f5a5a4950474e4d524337324331344638333944/programmi/shedainsegnamento"]),
-            make_course("Financial Econometrics", "27382", 6, "DISES – LM Economics and Finance", "Second", "II",
-                        links=[
-                            "https://www.docenti.unina.it/#!/professor/414e4e414c49534153434f474e414d49474c494f5343474e4c5338355234314638333953/programmi/shedainsegnamento"]),
-            make_course("Mathematics for Economics and Finance", "25884", 12, "DISES – LM Economics and Finance",
-                        "Second", "I", links=[
-                    "https://www.docenti.unina.it/#!/professor/414348494c4c45424153494c4542534c434c4c3538413231493239334f/programmi/shedainsegnamento"]),
-        ]
+        if "specializations" in st.session_state and isinstance(st.session_state["specializations"], dict):
+            catalog = _editable_catalog()
+            it = dict(catalog.get("Curriculum INFORMATION TECHNOLOGIES", {}))
+            it.update(st.session_state.specializations)
+            catalog["Curriculum INFORMATION TECHNOLOGIES"] = it
+            del st.session_state["specializations"]
+
+        st.session_state._inited = True
 
     # -------------------- Catalog overview --------------------
     with st.expander("📚 Catalog Overview (Codes, CFUs, Dept, Year, Semester, Links)"):
-        rows = []
-        for main_path, subpaths in st.session_state.catalog.items():
-            for sub_path, courses in subpaths.items():
-                for idx, c in enumerate(courses, start=1):
-                    links = c.get("links", [])
-                    rows.append({
-                        "Type": "Curricular",
-                        "Main Path": main_path,
-                        "Sub Path": sub_path,
-                        "Slot": f"Curricular {idx}",
-                        "Course": c["name"],
-                        "Code": c["code"],
-                        "CFU": c["cfu"],
-                        "Dept": c["dept"],
-                        "Year": c["year"],
-                        "Semester": c["semester"],
-                        "Link 1": links[0] if len(links) > 0 else None,
-                        "Link 2": links[1] if len(links) > 1 else None,
-                    })
-        for c in st.session_state.free_choice_courses:
-            links = c.get("links", [])
-            rows.append({
-                "Type": "Free Choice",
-                "Main Path": "—",
-                "Sub Path": "—",
-                "Slot": "—",
-                "Course": c["name"],
-                "Code": c["code"],
-                "CFU": c["cfu"],
-                "Dept": c["dept"],
-                "Year": c["year"],
-                "Semester": c["semester"],
-                "Link 1": links[0] if len(links) > 0 else None,
-                "Link 2": links[1] if len(links) > 1 else None,
-            })
-        for c in FIXED_COMPONENTS:
-            rows.append({
-                "Type": "Fixed",
-                "Main Path": "—",
-                "Sub Path": "—",
-                "Slot": "—",
-                "Course": c["name"],
-                "Code": c["code"],
-                "CFU": c["cfu"],
-                "Dept": c["dept"],
-                "Year": c["year"],
-                "Semester": c["semester"],
-                "Link 1": None,
-                "Link 2": None,
-            })
-        df = pd.DataFrame(rows)
-        st.dataframe(
-            df,
-            use_container_width=True,
-            column_config={
-                "Link 1": st.column_config.LinkColumn("Link 1", display_text="Open"),
-                "Link 2": st.column_config.LinkColumn("Link 2", display_text="Open"),
-            },
-        )
+        # The expander body runs (and ships its table) on every rerun even when collapsed: build it only on request
+        if st.toggle("Show catalog table", key="show_overview"):
+            # Flattened overview rows; reset to None whenever the teacher edits the catalog
+            if st.session_state.get("catalog_flat") is None:
+                st.session_state.catalog_flat = flatten_catalog(st.session_state.catalog)
+            if st.session_state.get("free_flat") is None:
+                st.session_state.free_flat = [
+                    overview_row(c, "Free Choice") for c in st.session_state.free_choice_courses.values()
+                ]
+
+            df = pd.DataFrame.from_records(
+                chain(st.session_state.catalog_flat, st.session_state.free_flat, _FIXED_FLAT), columns=OVERVIEW_COLUMNS
+            ).astype(_OVERVIEW_CATEGORICAL)
+            st.dataframe(
+                df,
+                use_container_width=True,
+                column_config={
+                    "Link 1": st.column_config.LinkColumn("Link 1", display_text="Open"),
+                    "Link 2": st.column_config.LinkColumn("Link 2", display_text="Open"),
+                },
+            )
 
     # -------------------- Teacher tools --------------------
     if teacher_logged_in:
@@ -937,14 +1021,18 @@ def main():
                 submitted = st.form_submit_button("➕ Add / Update Sub Path")
             if submitted:
                 if main_selected and sub_path and c1_name and c2_name and c1_code and c2_code:
-                    if main_selected not in st.session_state.catalog:
-                        st.session_state.catalog[main_selected] = {}
-                    st.session_state.catalog[main_selected][sub_path] = [
+                    catalog = _editable_catalog()
+                    if main_selected not in catalog:
+                        catalog[main_selected] = {}
+                    catalog[main_selected][sub_path] = [
                         make_course(c1_name, c1_code, c1_cfu, c1_dept, c1_year, c1_sem,
                                     links=[l for l in [c1_l1, c1_l2] if l]),
                         make_course(c2_name, c2_code, c2_cfu, c2_dept, c2_year, c2_sem,
                                     links=[l for l in [c2_l1, c2_l2] if l]),
                     ]
+                    st.session_state.catalog_flat = None
+                    st.session_state.sub_path_options = {}
+                    st.session_state.free_choice_views = {}
                     st.success(f"✅ Saved sub path '{sub_path}' under main path '{main_selected}'.")
                 else:
                     st.error("⚠ Please fill all required fields (names & codes).")
@@ -962,13 +1050,18 @@ def main():
                 submitted_free = st.form_submit_button("➕ Add Free Choice Course")
             if submitted_free:
                 if f_name and f_code:
-                    if all(fc["name"] != f_name for fc in st.session_state.free_choice_courses):
+                    f_key = free_choice_key(f_code)
+                    if f_key in st.session_state.free_choice_courses:
+                        st.warning("A free choice course with this code already exists.")
+                    elif f_name in st.session_state.free_index:
+                        st.warning("A free choice course with this name already exists.")
+                    else:
                         links = [l for l in [f_l1, f_l2] if l]
-                        st.session_state.free_choice_courses.append(
-                            make_course(f_name, f_code, f_cfu, f_dept, f_year, f_sem, links=links))
+                        _editable_free_choice()[f_key] = make_course(
+                            f_name, f_code, f_cfu, f_dept, f_year, f_sem, links=links)
+                        st.session_state.free_flat = None
+                        _refresh_free_index()
                         st.success(f"✅ Course '{f_name}' added!")
-                    else:
-                        st.warning("A free choice course with this name already exists.")
                 else:
                     st.error("⚠ Please enter a course name and code.")
 
@@ -1054,7 +1147,7 @@ def main():
         )
 
         if main_choice != "Select Main Path":
-            sub_paths = ["Select Sub Path"] + list(st.session_state.catalog[main_choice].keys())
+            sub_paths = _sub_path_options(main_choice)
             sub_choice = st.selectbox(
                 "📂 Choose Sub Path:",
                 sub_paths,
@@ -1071,14 +1164,14 @@ def main():
             if plan_is_psi:
                 c = curr_courses[0]
                 st.markdown(
-                    f"- **Curricular 1: {c['name']}** — `{c['code']}` • **{c['cfu']} CFU** • {c['dept']} • Year: {c['year']} • Semester: {c['semester']}")
+                    f"- **Curricular 1: {c.name}** — `{c.code}` • **{c.cfu} CFU** • {c.dept} • Year: {c.year} • Semester: {c.semester}")
                 st.info(
                     "You are in PSI mode: only Curricular Exam I is included. Select 3 free-choice exams to reach at least 60 CFU.")
             else:
-                for idx, c in enumerate(curr_courses, start=1):
-                    st.markdown(
-                        f"- **Curricular {idx}: {c['name']}** — `{c['code']}` • **{c['cfu']} CFU** • {c['dept']} • Year: {c['year']} • Semester: {c['semester']}"
-                    )
+                st.markdown("\n".join(
+                    f"- **Curricular {idx}: {c.name}** — `{c.code}` • **{c.cfu} CFU** • {c.dept} • Year: {c.year} • Semester: {c.semester}"
+                    for idx, c in enumerate(curr_courses, start=1)
+                ))
 
             # Notice before free-choice picker
             st.markdown(
@@ -1088,20 +1181,12 @@ def main():
             # Determine how many free-choice exams are required
             n_free_required = 3 if plan_is_psi else 2
 
-            # Build curricular sets (exclude duplicates by code or name)
             curricular_list = [curr_courses[0]] if plan_is_psi else curr_courses
-            curr_codes = {str(c["code"]).strip().upper() for c in curricular_list}
-            curr_names = {c["name"].strip().lower() for c in curricular_list}
-
-            # Path-specific forbidden free-choice codes
-            banned_by_subpath = {
-                "PDS ITE/TS - CURRICULUM INFORMATION TECHNOLOGIES/TEXT AND SPEECH PROCESSING": {"U5902"},  # Text Mining
-                "PDS ITE/SV - CURRICULUM INFORMATION TECHNOLOGIES/SIGNAL AND VIDEO PROCESSING": {"U1644"},
-                # Information Theory
-                "PDS ITE/AI - CURRICULUM INFORMATION TECHNOLOGIES/DATA SECURITY": {"U2652"},  # Data Security
-                "PDS ISY - CURRICULUM INTELLIGENT SYSTEMS": {"U7219"},  # Computational Intelligence
-            }
-            banned_codes = banned_by_subpath.get(sub_choice, set())
+
+            # Curricular sets (exclude duplicates by code or name), the path-specific forbidden free-choice codes
+            # and the catalogue courses left to pick
+            curr_codes, curr_names, banned_codes, available_free_by_label = _free_choice_view(
+                main_choice, sub_choice, plan_is_psi)
 
             # --- Choose free-choice mode
             free_choice_mode = st.radio(
@@ -1118,21 +1203,13 @@ def main():
             max_catalogue = 3 if plan_is_psi else 2
 
             if not using_custom:
-                # Filter available free-choice courses
-                available_free_courses = [
-                    fc for fc in st.session_state.free_choice_courses
-                    if str(fc["code"]).strip().upper() not in curr_codes
-                       and fc["name"].strip().lower() not in curr_names
-                       and str(fc["code"]).strip().upper() not in banned_codes
-                ]
-
                 st.markdown("### 🎯 Select Free Choice Courses (Catalogue):")
                 help_txt = (
                     "Select **one 12 CFU course** or **two courses totaling at least 12 CFU**."
                     if not plan_is_psi else
                     "Select **exactly 3** courses."
                 )
-                free_labels = [course_label(c) for c in available_free_courses]
+                free_labels = list(available_free_by_label)
                 free_choice_selection_labels = st.multiselect(
                     "Choose your free-choice courses:",
                     free_labels,
@@ -1140,7 +1217,9 @@ def main():
                     placeholder="Type to search free-choice courses…",
                     help=help_txt,
                 )
-                selected_free = [c for c in available_free_courses if course_label(c) in free_choice_selection_labels]
+                # Catalogue order (not click order) for the PDF rows and the upload log; set lookups keep it linear
+                chosen = set(free_choice_selection_labels)
+                selected_free = [c for label, c in available_free_by_label.items() if label in chosen]
 
             else:
                 # Manual MS course entry
@@ -1164,11 +1243,6 @@ def main():
 
                 custom_free = []
                 valid_custom = True
-                errors = []
-
-                # Track duplicates among custom entries too
-                seen_codes = set()
-                seen_names = set()
 
                 for i in range(num_manual):
                     st.markdown(f"**Free Choice #{i + 1}**")
@@ -1191,56 +1265,27 @@ def main():
                     if not (fc_name and fc_code and fc_dept):
                         valid_custom = False
 
-                    # Normalize for checks
-                    code_up = (fc_code or "").strip().upper()
-                    name_lo = (fc_name or "").strip().lower()
-
-                    # No duplicates with curriculars (by code OR name)
-                    if code_up and (code_up in curr_codes):
-                        valid_custom = False
-                        errors.append(f"- #{i + 1}: code '{fc_code}' duplicates a curricular course.")
-                    if name_lo and (name_lo in curr_names):
-                        valid_custom = False
-                        errors.append(f"- #{i + 1}: name '{fc_name}' duplicates a curricular course.")
-
-                    # Path-specific exclusions (same as catalogue)
-                    if code_up and (code_up in banned_codes):
-                        valid_custom = False
-                        errors.append(f"- #{i + 1}: code '{fc_code}' is not allowed for the selected sub path.")
-
-                    # No duplicates among custom entries
-                    if code_up:
-                        if code_up in seen_codes:
-                            valid_custom = False
-                            errors.append(f"- #{i + 1}: code '{fc_code}' is duplicated in your custom list.")
-                        else:
-                            seen_codes.add(code_up)
-                    if name_lo:
-                        if name_lo in seen_names:
-                            valid_custom = False
-                            errors.append(f"- #{i + 1}: name '{fc_name}' is duplicated in your custom list.")
-                        else:
-                            seen_names.add(name_lo)
-
                     custom_free.append(
                         make_course(fc_name or "", fc_code or "", int(fc_cfu), fc_dept or "", fc_year or "Second",
                                     fc_sem or "Second")
                     )
 
-                if errors:
-                    st.error("Please fix the following issues before generating the PDF:\n" + "\n".join(errors))
+                issues = custom_free_errors(custom_free, curr_codes, curr_names, banned_codes)
+                if issues:
+                    valid_custom = False
+                    st.error(
+                        "Please fix the following issues before generating the PDF:\n" + format_custom_free_errors(issues)
+                    )
 
             # Totals
-            fixed_total = sum(x["cfu"] for x in FIXED_COMPONENTS)
-            curricular_total = sum(c["cfu"] for c in curricular_list)
-            chosen_free = selected_free if not using_custom else custom_free
-            free_total = sum(c["cfu"] for c in chosen_free)
-            current_total = fixed_total + curricular_total + free_total
+            curricular_total = sum(map(_cfu, curricular_list))
+            free_total = sum(map(_cfu, custom_free if using_custom else selected_free))
+            current_total = FIXED_CFU_TOTAL + curricular_total + free_total
             excess = max(0, current_total - 60)
 
             st.caption(
                 f"Planned CFUs so far: Curricular **{curricular_total}**, Free-choice **{free_total}**, "
-                f"Fixed components **{fixed_total}** → **{current_total}/60 CFU**"
+                f"Fixed components **{FIXED_CFU_TOTAL}** → **{current_total}/60 CFU**"
             )
 
             # PSI minimum
@@ -1259,44 +1304,24 @@ def main():
             # Can-generate flags (allow up to 66 CFU)
             requires_approval = plan_is_psi or using_custom or (excess > 0)
 
+            # Scalar checks first so `and` short-circuits before any per-course scan
             can_generate_catalogue = (
                     (not using_custom)
-                    and meets_free_requirement(selected_free, plan_is_psi)
-                    and (not plan_is_psi or current_total >= 60)
                     and (current_total <= 66)
+                    and (not plan_is_psi or current_total >= 60)
+                    and meets_free_requirement(selected_free, plan_is_psi)
             )
 
+            # valid_custom already folds in the required fields and every clash/duplicate check, from the single
+            # pass over the entries above
             can_generate_custom = (
                     using_custom
                     and valid_custom
-                    and all(cf["name"] and cf["code"] and cf["dept"] for cf in custom_free)
-                    and all(
-                cf["code"].strip().upper() not in curr_codes
-                and cf["name"].strip().lower() not in curr_names
-                for cf in custom_free
-            )
-                    and all(cf["code"].strip().upper() not in banned_codes for cf in custom_free)
-                    and meets_free_requirement(custom_free, plan_is_psi)
-                    and (not plan_is_psi or current_total >= 60)
                     and (current_total <= 66)
+                    and (not plan_is_psi or current_total >= 60)
+                    and meets_free_requirement(custom_free, plan_is_psi)
             )
 
-            def short_code_from_subpath(label: str) -> str:
-                """
-                Extracts short code (e.g., 'ITE/TS', 'ECO', 'ISY', 'FSE/PH') from your sub-path label,
-                which typically looks like 'PDS ITE/TS - CURRICULUM ...'.
-                """
-                if not label:
-                    return "PLAN"
-                # remove any suffix like " — Piano di Studi Individuale" if ever present
-                base = label.split(" — ", 1)[0]
-                # take the part before " - "
-                head = base.split(" - ", 1)[0].strip()
-                # strip optional "PDS " prefix
-                if head.upper().startswith("PDS "):
-                    head = head[4:].strip()
-                return head  # e.g. "ITE/TS", "ECO", "ISY", "FSE/PH"
-
             # Generate PDF
             # Generate PDF & Submit (with spinner, disabled button, and clear status)
             can_generate = (can_generate_catalogue or can_generate_custom)
@@ -1317,14 +1342,13 @@ def main():
                         dob_str = dob.strftime("%d/%m/%Y") if hasattr(dob, 'strftime') else str(dob)
                         free_block = selected_free if not using_custom else custom_free
 
-                        if plan_is_psi:
-                            ordered_courses = [curr_courses[0], *free_block, *FIXED_COMPONENTS]
-                        else:
-                            ordered_courses = [curr_courses[0], curr_courses[1], *free_block, *FIXED_COMPONENTS]
+                        curricular_block = (curr_courses[0],) if plan_is_psi else (curr_courses[0], curr_courses[1])
+                        ordered_courses = (*curricular_block, *free_block, *FIXED_COMPONENTS)
 
                         wm = "To Be Approved" if requires_approval else None
 
-                        pdf_buf = build_study_plan_pdf(
+                        pdf_bytes = study_plan_pdf_bytes(
+                            date.today().isoformat(),
                             name=name, matricula=matricula, pob=pob, dob_str=dob_str,
                             phone=phone, email=email, academic_year=academic_year,
                             year_of_degree=year_of_degree, degree_type=degree_type,
@@ -1340,14 +1364,12 @@ def main():
                         plan_code = short_code_from_subpath(sub_choice)
                         plan_name = plan_code.replace("/", "-") + ("-PSI" if plan_is_psi else "")
                         raw_fname = f"{(matricula or 'studente').strip()}_{plan_name}".strip("_")
-                        safe_fname = "".join(ch if ch.isalnum() or ch in "._-" else "_" for ch in raw_fname)
+                        safe_fname = raw_fname.translate(_FILENAME_TABLE)
                         fname = f"{safe_fname}.pdf"
-                        pdf_bytes = pdf_buf.getvalue()
 
                         # ---- payloads exactly as before (you were already logging these) ----
-                        curricular_for_log = [curr_courses[0]] if plan_is_psi else curr_courses[:2]
+                        curricular_for_log = curricular_block
                         free_for_log = free_block
-                        fixed_for_log = FIXED_COMPONENTS
 
                         student_payload = {
                             "name": name,
@@ -1369,20 +1391,22 @@ def main():
                             "using_custom_free": using_custom,
                             "requires_approval": requires_approval,
                             "total_cfu": current_total,
-                            "curricular_courses": [serialize_course(c) for c in curricular_for_log],
-                            "free_courses": [serialize_course(c) for c in free_for_log],
-                            "fixed_components": [serialize_course(c) for c in fixed_for_log],
+                            "curricular_courses": [_serialized_course(c) for c in curricular_for_log],
+                            "free_courses": [_serialized_course(c) for c in free_for_log],
+                            "fixed_components": FIXED_COMPONENTS_SERIALIZED,
                         }
 
-                        # ---- submit to Google with clear status ----
-                        # ---- submit to Google (silent; no UI message here) ----
-                        resp = {}
-                        try:
-                            resp = send_to_google(pdf_bytes, fname, student=student_payload, meta=meta_payload)
-                        except Exception:
-                            pass  # ignore errors in the UI; still allow download
+                        # ---- submit to Google in the background (silent; no UI message here) ----
+                        # Not awaited: the reply lands in this session's dict and its Drive link shows on a later rerun
+                        reply = st.session_state["upload_reply"] = {}
+                        gs = _secrets()
+                        upload = _upload_pool().submit(
+                            send_to_google, pdf_bytes, fname, student=student_payload, meta=meta_payload,
+                            url=gs["RECEIVER_URL"], api_key=gs["GS_API_KEY"],
+                        )
+                        upload.add_done_callback(partial(_keep_upload_reply, reply))
 
-                        # ---- show download button ----
+                        # ---- show download button while the upload is in flight ----
                         st.download_button(
                             "⬇ Download PDF Copy",
                             data=pdf_bytes,
@@ -1394,10 +1418,6 @@ def main():
                         # ---- single line shown when the download button appears ----
                         st.success("generated and submitted..")
 
-                        # (optional) still show Drive link if we have it
-                        if resp.get("ok") and resp.get("fileUrl"):
-                            st.caption(f"Drive link: {resp['fileUrl']}")
-
                         # ---- show download only AFTER generation ----
                         #st.download_button("⬇ Download PDF Copy", data=pdf_bytes, file_name=fname, mime="application/pdf")
 
@@ -1414,6 +1434,11 @@ def main():
                     if current_total > 66:
                         st.warning("Reduce CFUs to 66 or less to enable submission.")
 
+            # (optional) Drive link of the last submission, once the background upload has replied
+            reply = st.session_state.get("upload_reply") or {}
+            if reply.get("ok") and reply.get("fileUrl"):
+                st.caption(f"Drive link: {reply['fileUrl']}")
+
 
 if __name__ == "__main__":
     main()